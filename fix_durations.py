@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Fix audio durations in the database by probing actual files with ffprobe.
+Fix audio durations in the database by probing actual files with PyAV.
 
 Usage:
     # Dry run (preview without updating)
@@ -9,22 +9,26 @@ Usage:
     # Actually update the database
     python fix_durations.py
 
-    # Resume from a specific ID (if interrupted)
+    # Resume from a specific ID (if interrupted, the script prints the ID to use)
     python fix_durations.py --resume-from 123
 
     # Limit number of records to process
     python fix_durations.py --limit 100
+
+    # Tune concurrency and how many updates are committed at once
+    python fix_durations.py --workers 16 --batch-size 500
 """
 
 import argparse
-import json
-import subprocess
 import sys
 import os
+import multiprocessing
 from datetime import datetime
+from functools import partial
 
+import av
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -35,51 +39,40 @@ DATABASE_URL = os.getenv(
 )
 
 
-def get_duration_ffprobe(url: str, timeout: int = 30) -> float | None:
+def get_duration_av(url: str, timeout: int = 30) -> float | None:
     """
-    Get audio duration in seconds using ffprobe.
+    Get audio duration in seconds by reading the container with PyAV.
 
     Args:
         url: Public URL to the audio file
-        timeout: Timeout in seconds for ffprobe command
+        timeout: Timeout in seconds for opening and reading the file
 
     Returns:
         Duration in seconds (float), or None if failed
     """
     try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", url],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-
-        if result.returncode != 0:
-            return None
-
-        data = json.loads(result.stdout)
-        duration = data.get("format", {}).get("duration")
-
-        if duration:
-            return float(duration)
+        with av.open(url, timeout=timeout) as container:
+            if container.duration:
+                return container.duration / av.time_base
         return None
 
-    except subprocess.TimeoutExpired:
+    except av.error.TimeoutError:
         print(f"  Timeout probing: {url[:80]}...")
         return None
-    except json.JSONDecodeError:
-        print(f"  Invalid ffprobe output for: {url[:80]}...")
+    except av.error.InvalidDataError:
+        print(f"  Invalid audio data for: {url[:80]}...")
         return None
-    except FileNotFoundError:
-        print("ERROR: ffprobe not found. Install ffmpeg first:")
-        print("  macOS: brew install ffmpeg")
-        print("  Ubuntu: sudo apt install ffmpeg")
-        sys.exit(1)
     except Exception as e:
         print(f"  Error probing {url[:80]}...: {e}")
         return None
 
 
+def probe_record(work: tuple, timeout: int = 30) -> tuple:
+    """Probe one (record_id, url) pair; runs in a worker process."""
+    record_id, url = work
+    return record_id, get_duration_av(url, timeout=timeout)
+
+
 def fetch_recordings(
     cursor,
     resume_from: str | None = None,
@@ -110,16 +103,40 @@ def fetch_recordings(
     return cursor.fetchall()
 
 
-def update_duration(cursor, record_id: int, duration_ms: int):
-    """Update a single recording's duration."""
-    cursor.execute(
-        "UPDATE conversation_recordings SET duration = %s WHERE id = %s",
-        (duration_ms, record_id),
+def update_durations(cursor, updates: list[tuple[int, int]]):
+    """Update a batch of (record_id, duration_ms) pairs in a single statement."""
+    execute_values(
+        cursor,
+        """
+        UPDATE conversation_recordings AS cr
+        SET duration = v.duration
+        FROM (VALUES %s) AS v(id, duration)
+        WHERE cr.id = v.id
+        """,
+        updates,
+        page_size=len(updates),
     )
 
 
+def commit_updates(conn, cursor, updates: list[tuple[int, int]]) -> bool:
+    """
+    Apply a batch of (record_id, duration_ms) updates in a single transaction.
+
+    Returns True if the batch was committed, False if it was rolled back.
+    """
+    try:
+        update_durations(cursor, updates)
+        conn.commit()
+        print(f"  Committed {len(updates)} updates")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"  DB ERROR (rolled back {len(updates)} updates): {e}")
+        return False
+
+
 def main():
-    parser = argparse.ArgumentParser(description="Fix audio durations using ffprobe")
+    parser = argparse.ArgumentParser(description="Fix audio durations using PyAV")
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -135,6 +152,18 @@ def main():
         default=30,
         help="Timeout per file in seconds (default: 30)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=32,
+        help="Number of worker processes probing files (default: 32)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Number of updates per database commit (default: 500)",
+    )
     parser.add_argument(
         "--include-dead-urls",
         action="store_true",
@@ -172,49 +201,84 @@ def main():
         print("Nothing to do!")
         return
 
-    # Process each recording
+    # Probe recordings across worker processes, so demuxing and result handling
+    # run on every core rather than behind one GIL, and commit updates in
+    # batches rather than once per record
     success = 0
     failed = 0
     skipped = 0
+    pending = []
+    # IDs handled for good: committed, probed in a dry run, or failed to probe
+    done = set()
+    finished = False
+
+    old_durations = {record["id"]: record["duration"] for record in recordings}
+    work = [(record["id"], record["audioFileUrl"]) for record in recordings]
+    probe = partial(probe_record, timeout=args.timeout)
+
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.imap_unordered(probe, work, chunksize=8)
+
+            for i, (record_id, duration_sec) in enumerate(results, 1):
+                old_duration = old_durations[record_id]
+
+                # Progress indicator
+                pct = (i / total) * 100
+                prefix = f"[{i}/{total}] ({pct:.1f}%) ID={record_id}"
+
+                if duration_sec is None:
+                    print(f"{prefix} FAILED")
+                    failed += 1
+                    done.add(record_id)
+                    continue
+
+                # Convert to milliseconds (integer)
+                duration_ms = int(duration_sec * 1000)
 
-    for i, record in enumerate(recordings, 1):
-        record_id = record["id"]
-        url = record["audioFileUrl"]
-        old_duration = record["duration"]
-
-        # Progress indicator
-        pct = (i / total) * 100
-        print(f"[{i}/{total}] ({pct:.1f}%) ID={record_id}", end=" ")
-
-        # Probe the file
-        duration_sec = get_duration_ffprobe(url, timeout=args.timeout)
-
-        if duration_sec is None:
-            print("FAILED")
-            failed += 1
-            continue
-
-        # Convert to milliseconds (integer)
-        duration_ms = int(duration_sec * 1000)
-
-        # Compare with old value
-        old_display = f"{old_duration}ms" if old_duration else "NULL"
-        print(f"{old_display} -> {duration_ms}ms ({duration_sec:.2f}s)", end=" ")
-
-        if not args.dry_run:
-            try:
-                update_duration(cursor, record_id, duration_ms)
-                conn.commit()
-                print("UPDATED")
-            except Exception as e:
-                conn.rollback()
-                print(f"DB ERROR: {e}")
-                failed += 1
-                continue
-        else:
-            print("(dry run)")
-
-        success += 1
+                # Compare with old value
+                old_display = f"{old_duration}ms" if old_duration else "NULL"
+                change = f"{old_display} -> {duration_ms}ms ({duration_sec:.2f}s)"
+
+                if args.dry_run:
+                    print(f"{prefix} {change} (dry run)")
+                    success += 1
+                    done.add(record_id)
+                    continue
+
+                print(f"{prefix} {change} QUEUED")
+                pending.append((record_id, duration_ms))
+
+                if len(pending) >= args.batch_size:
+                    if commit_updates(conn, cursor, pending):
+                        success += len(pending)
+                        done.update(record_id for record_id, _ in pending)
+                    else:
+                        failed += len(pending)
+                    pending = []
+
+        finished = True
+
+    except KeyboardInterrupt:
+        print()
+        print("Interrupted, committing queued updates before exiting")
+
+    finally:
+        # Commit whatever is left from the last partial batch, also after a
+        # Ctrl-C or a crash, so probed durations are not thrown away
+        if pending:
+            if commit_updates(conn, cursor, pending):
+                success += len(pending)
+                done.update(record_id for record_id, _ in pending)
+            else:
+                failed += len(pending)
+
+        if not finished:
+            # Results arrive out of order, so the last printed ID is not a safe
+            # resume point; resume from the first ID not handled yet instead
+            resume_from = next((rid for rid, _ in work if rid not in done), None)
+            if resume_from is not None:
+                print(f"Resume with: --resume-from {resume_from}")
 
     # Summary
     print()
@@ -235,6 +299,9 @@ def main():
     cursor.close()
     conn.close()
 
+    if not finished:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()